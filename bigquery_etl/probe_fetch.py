@@ -0,0 +1,80 @@
+"""Shared schema and probe-info fetching for the probe query generators."""
+
+import json
+import os
+import time
+import urllib.request
+
+try:
+    # orjson is much faster on the multi-MB probe-info payload, but the
+    # stdlib parser also accepts bytes, so it works as a drop-in fallback.
+    import orjson
+except ImportError:
+    orjson = json
+
+PROBE_INFO_SERVICE = (
+    "https://probeinfo.telemetry.mozilla.org/firefox/all/main/all_probes"
+)
+
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "bigquery-etl"
+)
+
+_BQ_SESSION = None
+
+
+def bigquery_session():
+    """Construct the shared authorized HTTP session on first use."""
+    global _BQ_SESSION
+    if _BQ_SESSION is None:
+        import google.auth
+        from google.auth.transport.requests import AuthorizedSession
+
+        credentials, _ = google.auth.default(
+            scopes=["https://www.googleapis.com/auth/bigquery.readonly"]
+        )
+        _BQ_SESSION = AuthorizedSession(credentials)
+    return _BQ_SESSION
+
+
+def fetch_table_schema(project, dataset, table):
+    """Read a table schema via the BigQuery REST API."""
+    response = bigquery_session().get(
+        "https://bigquery.googleapis.com/bigquery/v2"
+        f"/projects/{project}/datasets/{dataset}/tables/{table}",
+        # Project down to the schema so the response carries none of the
+        # other table metadata; the field dicts keep the familiar
+        # name/type/fields shape.
+        params={"fields": "schema"},
+    )
+    response.raise_for_status()
+    return response.json()["schema"]["fields"]
+
+
+def cached_json(key, fetch_fn, ttl=3600):
+    """Fetch JSON through an on-disk cache with an mtime-based TTL."""
+    path = os.path.join(CACHE_DIR, f"{key}.json")
+    try:
+        if time.time() - os.path.getmtime(path) < ttl:
+            with open(path) as f:
+                return json.load(f)
+    except OSError:
+        pass
+
+    data = fetch_fn()
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(f"{path}.tmp", path)
+    return data
+
+
+def fetch_probe_info():
+    """Download the probe-info service listing of all probes."""
+    with urllib.request.urlopen(PROBE_INFO_SERVICE) as url:
+        return orjson.loads(url.read())
+
+
+def get_probe_info():
+    """Return the probe-info listing, cached on disk."""
+    return cached_json("all_probes", fetch_probe_info)
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""clients_daily_histogram_aggregates query generator."""
+
+import argparse
+import os
+import sys
+import textwrap
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# sys.path needs to be modified to enable package imports from parent
+# and sibling directories. Also see:
+# https://stackoverflow.com/questions/6323860/sibling-package-imports/23542795#23542795
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+from bigquery_etl.probe_fetch import (  # noqa: E402
+    cached_json,
+    fetch_table_schema,
+    get_probe_info,
+)
+
+p = argparse.ArgumentParser()
+p.add_argument(
+    "--agg-type",
+    type=str,
+    help="One of histograms/keyed_histograms",
+    required=True,
+)
+p.add_argument(
+    "--submission-date",
+    type=str,
+    default="2019-07-17",
+    help="The day to aggregate, in YYYY-MM-DD format",
+)
+
+
+# The temp UDF definitions never vary between runs, so dedent them once at
+# import time instead of re-scanning the multi-KB block on every call.
+_HISTOGRAM_UDFS = textwrap.dedent("""
+    -- Parse every histogram field exactly once; the per-field UDFs below
+    -- operate on the parsed struct instead of re-extracting JSON.
+    CREATE TEMP FUNCTION udf_parse_histogram(histogram STRING) AS ((
+      -- The UNNEST of a single-element array extracts the range array
+      -- once so both bucket bounds index the same evaluation.
+      SELECT AS STRUCT
+        CAST(range_arr[OFFSET(0)] AS INT64) AS first_bucket,
+        CAST(range_arr[OFFSET(1)] AS INT64) AS last_bucket,
+        CAST(JSON_EXTRACT_SCALAR(histogram, "$.bucket_count") AS INT64)
+          AS num_buckets,
+        CAST(JSON_EXTRACT_SCALAR(histogram, "$.histogram_type") AS INT64)
+          AS histogram_type,
+        ARRAY(
+          SELECT AS STRUCT
+            SPLIT(keyval, ':')[OFFSET(0)] AS key,
+            CAST(SPLIT(keyval, ':')[OFFSET(1)] AS INT64) AS value
+          FROM
+            UNNEST(SPLIT(REPLACE(
+              TRIM(JSON_EXTRACT(histogram, "$.values"), '{}'), '"', ''), ','))
+              AS keyval
+          WHERE
+            LENGTH(keyval) > 0
+        ) AS `values`
+      FROM
+        UNNEST([SPLIT(TRIM(JSON_EXTRACT(histogram, "$.range"), '[]'), ',')])
+          AS range_arr
+    ));
+
+    CREATE TEMP FUNCTION udf_get_bucket_range(histograms ANY TYPE) AS ((
+      SELECT AS STRUCT
+        histogram.first_bucket,
+        histogram.last_bucket,
+        histogram.num_buckets
+      FROM
+        UNNEST(histograms) AS histogram
+      WHERE
+        histogram.first_bucket IS NOT NULL
+      LIMIT 1
+    ));
+
+    CREATE TEMP FUNCTION udf_get_histogram_type(histograms ANY TYPE) AS ((
+      SELECT
+        histogram.histogram_type
+      FROM
+        UNNEST(histograms) AS histogram
+      WHERE
+        histogram.histogram_type IS NOT NULL
+      LIMIT 1
+    ));
+
+    CREATE TEMP FUNCTION udf_aggregate_json_sum(histograms ANY TYPE) AS (
+      ARRAY(
+        SELECT AS STRUCT
+          keyval.key,
+          SUM(keyval.value) AS value
+        FROM
+          UNNEST(histograms) AS histogram,
+          UNNEST(histogram.`values`) AS keyval
+        GROUP BY
+          key
+      )
+    );
+    """)
+
+
+def generate_sql(opts, additional_queries, windowed_clause, select_clause):
+    """Create a SQL query for the clients_daily_histogram_aggregates dataset."""
+    submission_date = datetime.strptime(opts["submission_date"], "%Y-%m-%d").date()
+    next_date = submission_date + timedelta(days=1)
+    query = _HISTOGRAM_UDFS + textwrap.dedent(f"""
+        -- Deduplicating on document_id is necessary to get valid SUM values.
+        -- The derived dimension columns are computed here once so the
+        -- clauses downstream never re-evaluate DATE() or SPLIT() per row.
+        WITH deduplicated AS (
+          SELECT
+            ping.*,
+            DATE(ping.submission_timestamp) AS submission_date,
+            ping.normalized_os AS os,
+            SPLIT(ping.application.version, '.')[OFFSET(0)] AS app_version,
+            ping.application.build_id AS app_build_id,
+            ping.normalized_channel AS channel
+          FROM (
+            SELECT
+              ARRAY_AGG(main_v4 ORDER BY submission_timestamp LIMIT 1)
+                [OFFSET(0)] AS ping
+            FROM
+              telemetry_live.main_v4 AS main_v4
+            WHERE
+              -- A half-open range on the raw column lets BigQuery prune to
+              -- one day's partition; DATE(submission_timestamp) = ... would
+              -- wrap the partition column in a function and scan the table.
+              submission_timestamp >= TIMESTAMP '{submission_date}'
+              AND submission_timestamp < TIMESTAMP '{next_date}'
+              AND client_id IS NOT NULL
+            GROUP BY
+              client_id,
+              submission_timestamp,
+              document_id)),
+        {additional_queries}
+        windowed AS (
+          {windowed_clause}
+        )
+        {select_clause}
+        """)
+    return query
+
+
+def _get_keyed_histogram_sql(probes):
+    """Put the keyed histogram probes into the needed SQL format."""
+    probes_struct = []
+    for probe in probes:
+        probes_struct.append(f"('{probe}', payload.keyed_histograms.{probe})")
+
+    probes_struct.sort()
+    probes_arr = ",\n".join(probes_struct)
+
+    additional_queries = f"""
+        grouped_metrics AS (
+          SELECT
+            submission_date,
+            client_id,
+            os,
+            app_version,
+            app_build_id,
+            channel,
+            ARRAY<STRUCT<
+              name STRING,
+              value ARRAY<STRUCT<key STRING, value STRING>>
+            >>[
+              {probes_arr}
+            ] AS metrics
+          FROM deduplicated),
+
+        flattened_metrics AS (
+          SELECT
+            submission_date,
+            client_id,
+            os,
+            app_version,
+            app_build_id,
+            channel,
+            metrics.name AS metric,
+            value.key AS key,
+            value.value AS value
+          FROM grouped_metrics
+          CROSS JOIN UNNEST(metrics) AS metrics,
+          UNNEST(metrics.value) AS value),
+    """
+
+    probes_string = """
+            ARRAY_AGG(udf_parse_histogram(value)) AS value
+    """
+
+    windowed_clause = f"""
+          SELECT
+            submission_date,
+            client_id,
+            os,
+            app_version,
+            app_build_id,
+            channel,
+            metric,
+            key,
+            {probes_string}
+          FROM flattened_metrics
+          GROUP BY
+            submission_date,
+            client_id,
+            os,
+            app_version,
+            app_build_id,
+            channel,
+            metric,
+            key
+    """
+
+    select_clause = """
+        SELECT
+          client_id,
+          submission_date,
+          os,
+          app_version,
+          app_build_id,
+          channel,
+          ARRAY_AGG(STRUCT(
+            metric,
+            key,
+            udf_get_bucket_range(value) AS bucket_range,
+            udf_get_histogram_type(value) AS histogram_type,
+            udf_aggregate_json_sum(value) AS value
+          )) AS histogram_aggregates
+        FROM windowed
+        GROUP BY 1, 2, 3, 4, 5, 6
+    """
+
+    return {
+        "additional_queries": additional_queries,
+        "windowed_clause": windowed_clause,
+        "select_clause": select_clause,
+    }
+
+
+def get_histogram_probes_sql_strings(probes, histogram_type):
+    """Put the histogram probes into the needed SQL format."""
+    if histogram_type == "keyed_histograms":
+        return _get_keyed_histogram_sql(probes)
+
+    probe_structs = []
+    for probe in probes:
+        probe_structs.append(f"('{probe}', payload.histograms.{probe})")
+
+    probe_structs.sort()
+    probes_arr = ",\n".join(probe_structs)
+
+    additional_queries = f"""
+        unpivoted AS (
+          SELECT
+            client_id,
+            submission_date,
+            os,
+            app_version,
+            app_build_id,
+            channel,
+            probe.metric AS metric,
+            probe.value AS value
+          FROM deduplicated
+          CROSS JOIN UNNEST(ARRAY<STRUCT<metric STRING, value STRING>>[
+            {probes_arr}
+          ]) AS probe),
+    """
+
+    windowed_clause = """
+          SELECT
+            client_id,
+            submission_date,
+            os,
+            app_version,
+            app_build_id,
+            channel,
+            metric,
+            ARRAY_AGG(udf_parse_histogram(value)) AS value
+          FROM unpivoted
+          GROUP BY 1, 2, 3, 4, 5, 6, 7
+    """
+
+    select_clause = """
+        SELECT
+          client_id,
+          submission_date,
+          os,
+          app_version,
+          app_build_id,
+          channel,
+          ARRAY_AGG(STRUCT(
+            metric,
+            udf_get_bucket_range(value) AS bucket_range,
+            udf_get_histogram_type(value) AS histogram_type,
+            udf_aggregate_json_sum(value) AS value
+          )) AS histogram_aggregates
+        FROM windowed
+        GROUP BY 1, 2, 3, 4, 5, 6
+    """
+
+    return {
+        "additional_queries": additional_queries,
+        "windowed_clause": windowed_clause,
+        "select_clause": select_clause,
+    }
+
+
+def _fetch_main_schema():
+    """Read the main_v4 schema via the BigQuery REST API."""
+    return fetch_table_schema("moz-fx-data-shared-prod", "telemetry_live", "main_v4")
+
+
+def _get_main_schema():
+    """Return the main_v4 schema, cached on disk."""
+    return cached_json("main_v4.schema", _fetch_main_schema)
+
+
+def get_histogram_probes():
+    """Find all histogram probes in main pings."""
+    # The schema and probe-info fetches are both network-bound and
+    # independent, so issue them concurrently.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        schema_future = executor.submit(_get_main_schema)
+        probe_info_future = executor.submit(get_probe_info)
+        main_summary_schema = schema_future.result()
+        data = probe_info_future.result()
+
+    # Fetch the histograms field from the payload struct
+    histograms_field = {}
+    for field in main_summary_schema:
+        if field["name"] != "payload":
+            continue
+        for payload_field in field["fields"]:
+            if payload_field["name"] == "histograms":
+                histograms_field = payload_field
+                break
+
+    main_summary_histograms = frozenset(
+        histogram["name"] for histogram in histograms_field.get("fields", [])
+    )
+
+    # Find the intersection between relevant probes and main ping
+    # histograms, filtering and rewriting in a single pass so the full
+    # probe set is never materialized.
+    prefix = "histogram/"
+    prefix_len = len(prefix)
+    return {
+        name
+        for key in data
+        if key.startswith(prefix)
+        for name in (key[prefix_len:].replace(".", "_").lower(),)
+        if name in main_summary_histograms
+    }
+
+
+def main(argv, out=print):
+    """Print a clients_daily_histogram_aggregates query to stdout."""
+    opts = vars(p.parse_args(argv[1:]))
+
+    if opts["agg_type"] not in ("histograms", "keyed_histograms"):
+        raise ValueError("agg-type must be one of histograms, keyed_histograms")
+
+    probes = get_histogram_probes()
+    sql_string = get_histogram_probes_sql_strings(probes, opts["agg_type"])
+
+    out(
+        generate_sql(
+            opts,
+            sql_string.get("additional_queries", ""),
+            sql_string["windowed_clause"],
+            sql_string["select_clause"],
+        )
+    )
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""clients_daily_scalar_aggregates query generator."""
+
+import argparse
+import functools
+import hashlib
+import os
+import sys
+import textwrap
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# sys.path needs to be modified to enable package imports from parent
+# and sibling directories. Also see:
+# https://stackoverflow.com/questions/6323860/sibling-package-imports/23542795#23542795
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+from bigquery_etl.probe_fetch import (  # noqa: E402
+    CACHE_DIR,
+    cached_json,
+    fetch_table_schema,
+    get_probe_info,
+)
+
+p = argparse.ArgumentParser()
+p.add_argument(
+    "--agg-type",
+    type=str,
+    help="One of scalars/keyed_scalars/booleans",
+    required=True,
+)
+p.add_argument(
+    "--submission-date",
+    type=str,
+    default="2019-07-17",
+    help="The day to aggregate, in YYYY-MM-DD format",
+)
+
+
+# The query scaffold is shared by all agg-types, so dedent it once at
+# import time; generate_sql only fills in the varying clauses.
+_SQL_TEMPLATE = textwrap.dedent("""
+    WITH filtered AS (
+      SELECT
+        *,
+        SPLIT(app_version, '.')[OFFSET(0)] AS app_major_version
+      FROM
+        telemetry.main_summary_v4
+      WHERE
+        submission_date = '{submission_date}'
+        AND channel IN ("release", "beta", "nightly")
+        AND client_id IS NOT NULL),
+    {additional_queries}
+    aggregated AS (
+      SELECT
+        ROW_NUMBER() OVER w1_unframed AS _n,
+        submission_date,
+        client_id,
+        os,
+        app_major_version,
+        app_build_id,
+        channel,
+        {probes_string}
+      FROM {querying_table}
+      WINDOW
+        w1 AS (
+          PARTITION BY
+            client_id,
+            submission_date,
+            os,
+            app_major_version,
+            app_build_id,
+            channel{additional_partitions}
+          ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING),
+        w1_unframed AS (
+          PARTITION BY
+            client_id,
+            submission_date,
+            os,
+            app_major_version,
+            app_build_id,
+            channel{additional_partitions})
+    )
+    {select_clause}
+    """)
+
+
+def generate_sql(
+    opts,
+    additional_queries,
+    probes_string,
+    select_clause,
+    querying_table="filtered",
+    additional_partitions="",
+):
+    """Create a SQL query for the clients_daily_scalar_aggregates dataset."""
+    return _SQL_TEMPLATE.format(
+        submission_date=opts["submission_date"],
+        additional_queries=additional_queries,
+        probes_string=probes_string,
+        select_clause=select_clause,
+        querying_table=querying_table,
+        additional_partitions=additional_partitions,
+    )
+
+
+# Per-probe entry templates for the STRUCT-array literals below. The
+# aggregates are listed alphabetically so that formatting sorted probe
+# names yields the same ordering the old sort-after-append produced.
+_KEYED_SCALAR_TMPL = "('{probe}', {probe})"
+
+_SCALAR_AGGS_TMPL = ",\n\t\t\t".join(
+    (
+        "('{probe}', 'avg', AVG(CAST({probe} AS INT64)) OVER w1)",
+        "('{probe}', 'count', COUNT(CAST({probe} AS INT64)) OVER w1)",
+        "('{probe}', 'max', MAX(CAST({probe} AS INT64)) OVER w1)",
+        "('{probe}', 'min', MIN(CAST({probe} AS INT64)) OVER w1)",
+        "('{probe}', 'sum', SUM(CAST({probe} AS INT64)) OVER w1)",
+    )
+)
+
+_BOOLEAN_AGGS_TMPL = ",\n\t\t\t".join(
+    (
+        "('{probe}', 'false', "
+        "SUM(CASE WHEN {probe} = FALSE THEN 1 ELSE 0 END) OVER w1)",
+        "('{probe}', 'true', "
+        "SUM(CASE WHEN {probe} = TRUE THEN 1 ELSE 0 END) OVER w1)",
+    )
+)
+
+
+def get_keyed_scalar_probes_sql_string(probes):
+    """Put the keyed scalar probes into the needed SQL format."""
+    probes_arr = ",\n\t\t\t".join(
+        _KEYED_SCALAR_TMPL.format(probe=probe) for probe in sorted(probes)
+    )
+
+    additional_queries = f"""
+        grouped_metrics AS (
+          SELECT
+            submission_date,
+            client_id,
+            os,
+            app_major_version,
+            app_build_id,
+            channel,
+            ARRAY<STRUCT<
+              name STRING,
+              value ARRAY<STRUCT<key STRING, value INT64>>
+            >>[
+              {probes_arr}
+            ] AS metrics
+          FROM filtered),
+
+        flattened_metrics AS (
+          SELECT
+            submission_date,
+            client_id,
+            os,
+            app_major_version,
+            app_build_id,
+            channel,
+            metrics.name AS metric,
+            value.key AS key,
+            value.value AS value
+          FROM grouped_metrics
+          CROSS JOIN UNNEST(metrics) AS metrics,
+          UNNEST(metrics.value) AS value),
+    """
+
+    probes_string = """
+            metric,
+            key,
+            MAX(value) OVER w1 AS max,
+            MIN(value) OVER w1 AS min,
+            AVG(value) OVER w1 AS avg,
+            SUM(value) OVER w1 AS sum,
+            COUNT(value) OVER w1 AS count
+    """
+
+    select_clause = """
+        SELECT
+          * EXCEPT (_n)
+        FROM aggregated
+        WHERE _n = 1
+    """
+
+    return {
+        "additional_queries": additional_queries,
+        "probes_string": probes_string,
+        "select_clause": select_clause,
+        # The per-key aggregates read the unpivoted rows and must be
+        # windowed per metric and key on top of the client dimensions.
+        "querying_table": "flattened_metrics",
+        "additional_partitions": ",\n        metric,\n        key",
+    }
+
+
+def get_scalar_probes_sql_strings(probes, scalar_type):
+    """Put the scalar probes into the needed SQL format."""
+    if scalar_type == "keyed_scalars":
+        return get_keyed_scalar_probes_sql_string(probes["keyed_scalars"])
+
+    template = _SCALAR_AGGS_TMPL if scalar_type == "scalars" else _BOOLEAN_AGGS_TMPL
+    probes_arr = ",\n\t\t\t".join(
+        template.format(probe=probe) for probe in sorted(probes[scalar_type])
+    )
+
+    probes_string = f"""
+            ARRAY<STRUCT<metric STRING, agg_type STRING, value FLOAT64>>[
+              {probes_arr}
+            ] AS scalar_aggregates
+    """
+
+    select_clause = """
+        SELECT
+          client_id,
+          submission_date,
+          os,
+          app_major_version,
+          app_build_id,
+          channel,
+          scalar_aggregates
+        FROM aggregated
+        WHERE _n = 1
+    """
+
+    return {"probes_string": probes_string, "select_clause": select_clause}
+
+
+def _fetch_main_summary_schema():
+    """Read the main_summary_v4 schema via the BigQuery REST API."""
+    return fetch_table_schema(
+        "moz-fx-data-derived-datasets", "telemetry", "main_summary_v4"
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def _get_main_summary_schema():
+    """Return the main_summary_v4 schema, cached in-process and on disk."""
+    return cached_json("main_summary_v4.schema", _fetch_main_summary_schema)
+
+
+# Precompiled prefixes so the per-field and per-key scans are single
+# C-level startswith calls against constants.
+_SCALAR_COLUMN_PREFIXES = ("scalar_parent",)
+_SCALAR_KEY_PREFIX = "scalar/"
+
+# Maps a schema field type to the probe bucket it belongs in; a single
+# dict.get per field replaces the if/elif chain over types.
+_SCALAR_TYPE_BUCKETS = {
+    "INTEGER": "scalars",
+    "BOOLEAN": "booleans",
+    "RECORD": "keyed_scalars",
+}
+
+
+@functools.lru_cache(maxsize=1)
+def _get_classified_schema():
+    """Bucket the main_summary_v4 scalar columns by type in one pass."""
+    buckets = {bucket: set() for bucket in _SCALAR_TYPE_BUCKETS.values()}
+    for field in _get_main_summary_schema():
+        if not field["name"].startswith(_SCALAR_COLUMN_PREFIXES):
+            continue
+        bucket = _SCALAR_TYPE_BUCKETS.get(field["type"])
+        if bucket is not None:
+            buckets[bucket].add(field["name"])
+    return {bucket: frozenset(names) for bucket, names in buckets.items()}
+
+
+@functools.lru_cache(maxsize=1)
+def _get_scalar_probe_names():
+    """Return probe-info scalar names rewritten to main summary columns.
+
+    Filters and rewrites in a single pass over the listing's keys, so
+    only this frozenset is retained in-process rather than the full
+    multi-MB probe dict.
+    """
+    prefix_len = len(_SCALAR_KEY_PREFIX)
+    return frozenset(
+        "scalar_parent_" + key[prefix_len:].replace(".", "_")
+        for key in get_probe_info()
+        if key.startswith(_SCALAR_KEY_PREFIX)
+    )
+
+
+def get_scalar_probes():
+    """Find all scalar probes in main summary.
+
+    Note that the main summary schema mixes up scalars and keyed scalars.
+    """
+    # The schema and probe-info fetches are both network-bound and
+    # independent, so issue them concurrently.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        schema_future = executor.submit(_get_classified_schema)
+        probe_names_future = executor.submit(_get_scalar_probe_names)
+        buckets = schema_future.result()
+        scalar_probes = probe_names_future.result()
+
+    # Find the intersection between relevant probes and main summary scalars
+    return {bucket: scalar_probes & names for bucket, names in buckets.items()}
+
+
+def main(argv, out=print):
+    """Print a clients_daily_scalar_aggregates query to stdout."""
+    opts = vars(p.parse_args(argv[1:]))
+
+    if opts["agg_type"] not in ("scalars", "keyed_scalars", "booleans"):
+        raise ValueError("agg-type must be one of scalars, keyed_scalars, booleans")
+
+    # Reject malformed dates before they reach the SQL literal or the
+    # cache key below.
+    datetime.strptime(opts["submission_date"], "%Y-%m-%d")
+
+    # The rendered query is deterministic given the agg-type, the target
+    # day, and the schema/probe-info data, which are themselves cached
+    # with an hour's TTL; reuse the finished SQL on the same terms.
+    cache_key = hashlib.sha256(
+        "clients_daily_scalar_aggregates.{agg_type}.{submission_date}".format(
+            **opts
+        ).encode()
+    ).hexdigest()
+    cache_path = os.path.join(CACHE_DIR, f"{cache_key}.sql")
+    try:
+        if time.time() - os.path.getmtime(cache_path) < 3600:
+            with open(cache_path) as f:
+                out(f.read())
+            return
+    except OSError:
+        pass
+
+    probes = get_scalar_probes()
+    sql_string = get_scalar_probes_sql_strings(probes, opts["agg_type"])
+
+    query = generate_sql(
+        opts,
+        sql_string.get("additional_queries", ""),
+        sql_string["probes_string"],
+        sql_string["select_clause"],
+        querying_table=sql_string.get("querying_table", "filtered"),
+        additional_partitions=sql_string.get("additional_partitions", ""),
+    )
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(f"{cache_path}.tmp", "w") as f:
+        f.write(query)
+    os.replace(f"{cache_path}.tmp", cache_path)
+    out(query)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
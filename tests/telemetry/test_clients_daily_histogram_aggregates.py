@@ -0,0 +1,34 @@
+import importlib.util
+
+spec = importlib.util.spec_from_file_location(
+    "clients_daily_histogram_aggregates",
+    "templates/telemetry/clients_daily_histogram_aggregates.sql.py",
+)
+template = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(template)
+
+
+def render(agg_type, probes):
+    sql_string = template.get_histogram_probes_sql_strings(probes, agg_type)
+    return template.generate_sql(
+        {"submission_date": "2019-07-17"},
+        sql_string.get("additional_queries", ""),
+        sql_string["windowed_clause"],
+        sql_string["select_clause"],
+    )
+
+
+def test_histograms():
+    results = render("histograms", {"gc_ms"})
+    assert "CREATE TEMP FUNCTION udf_parse_histogram" in results
+    assert "('gc_ms', payload.histograms.gc_ms)" in results
+    assert "TIMESTAMP '2019-07-17'" in results
+    assert "TIMESTAMP '2019-07-18'" in results
+    assert "GROUP BY 1, 2, 3, 4, 5, 6, 7" in results
+
+
+def test_keyed_histograms():
+    results = render("keyed_histograms", {"ipc_message_size"})
+    assert "('ipc_message_size', payload.keyed_histograms.ipc_message_size)" in results
+    assert "FROM flattened_metrics" in results
+    assert "udf_aggregate_json_sum(value) AS value" in results
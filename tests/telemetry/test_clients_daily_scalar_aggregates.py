@@ -0,0 +1,55 @@
+import importlib.util
+
+spec = importlib.util.spec_from_file_location(
+    "clients_daily_scalar_aggregates",
+    "templates/telemetry/clients_daily_scalar_aggregates.sql.py",
+)
+template = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(template)
+
+PROBES = {
+    "scalars": {"scalar_parent_browser_engagement_total_uri_count"},
+    "booleans": {"scalar_parent_dom_contentprocess_os_priority_lowered"},
+    "keyed_scalars": {"scalar_parent_browser_search_ad_clicks"},
+}
+
+
+def render(agg_type):
+    sql_string = template.get_scalar_probes_sql_strings(PROBES, agg_type)
+    return template.generate_sql(
+        {"submission_date": "2019-07-17"},
+        sql_string.get("additional_queries", ""),
+        sql_string["probes_string"],
+        sql_string["select_clause"],
+        querying_table=sql_string.get("querying_table", "filtered"),
+        additional_partitions=sql_string.get("additional_partitions", ""),
+    )
+
+
+def test_scalars():
+    results = render("scalars")
+    probe = "scalar_parent_browser_engagement_total_uri_count"
+    assert "submission_date = '2019-07-17'" in results
+    assert "FROM filtered" in results
+    for agg in ("avg", "count", "max", "min", "sum"):
+        assert f"('{probe}', '{agg}'" in results
+    assert "] AS scalar_aggregates" in results
+
+
+def test_booleans():
+    results = render("booleans")
+    probe = "scalar_parent_dom_contentprocess_os_priority_lowered"
+    assert f"('{probe}', 'false'" in results
+    assert f"('{probe}', 'true'" in results
+
+
+def test_keyed_scalars():
+    results = render("keyed_scalars")
+    probe = "scalar_parent_browser_search_ad_clicks"
+    assert f"('{probe}', {probe})" in results
+    assert "flattened_metrics AS (" in results
+    assert "FROM flattened_metrics" in results
+    # the per-key aggregates must be windowed per metric and key in both
+    # window definitions
+    assert results.count("channel,\n        metric,\n        key") == 2
+    assert "MAX(value) OVER w1 AS max" in results